@@ -1,73 +1,301 @@
 # Copyright 2017-2022 Laszlo Attila Toth
 # Distributed under the terms of the Apache License, Version 2.0
 
+import abc
 import collections.abc
+import copy
+import functools
+import keyword
+import types
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# marks missing values, e.g. the omitted arguments of generated functions
+_MISSING = object()
+
+# id()s of frozen nodes whose __init__() is running, with the unknown members
+# set via __setattr__() meanwhile, see _frozen__init__()
+_initializing: dict[int, list[str]] = {}
+
+
+def _frozen__setattr__(cls):
+    def __setattr__(self, key, value):
+        if key not in self.__class__.__node_fields__ and key not in self.__dict__:
+            unknown = _initializing.get(id(self))
+            if unknown is None:
+                raise AttributeError(key)
+            # reported when __init__() returns
+            unknown.append(key)
+        elif not self.__class__.__node_custom_setattr__ and id(self) in _initializing:
+            # fast path: stored directly if no other __setattr__() is involved
+            self.__dict__[key] = value
+            return
+
+        # resolved on each call: subclasses may have a different MRO, e.g. with mixins
+        super(cls, self).__setattr__(key, value)
+
+    __setattr__.__node_frozen_setattr__ = True
+    return __setattr__
+
+
+def _frozen__init__(init):
+    if getattr(init, '__node_frozen_init__', False):
+        return init
+
+    @functools.wraps(init)
+    def __init__(self, *args, **kwargs):
+        node_id = id(self)
+        if node_id in _initializing:
+            # called via super().__init__() from a subclass
+            init(self, *args, **kwargs)
+            return
+
+        unknown = _initializing[node_id] = []
+        try:
+            init(self, *args, **kwargs)
+        finally:
+            del _initializing[node_id]
+
+        members = self.__dict__
+        for key in unknown:
+            # report the first unknown member set and not removed since
+            if key in members:
+                raise AttributeError(key)
+
+    __init__.__node_frozen_init__ = True
+    return __init__
+
+
+def _has_custom_setattr(cls) -> bool:
+    """
+    Check whether a class in the MRO defines its own __setattr__(),
+    the ones installed by @frozen don't count.
+    """
+    for base in cls.__mro__[:-1]:
+        setattr_ = base.__dict__.get('__setattr__')
+        if setattr_ is not None and not getattr(setattr_, '__node_frozen_setattr__', False):
+            return True
+
+    return False
+
+
+def _slot_names(cls) -> tuple[str, ...]:
+    """
+    Collect the names of the __slots__ members of cls and its bases,
+    similarly to copyreg._slotnames(), which isn't public.
+    """
+    names = []
+    for base in cls.__mro__:
+        slots = base.__dict__.get('__slots__', ())
+        if isinstance(slots, str):
+            slots = (slots,)
+
+        for name in slots:
+            if name in ('__dict__', '__weakref__'):
+                continue
+            if name.startswith('__') and not name.endswith('__'):
+                # private names are mangled
+                name = f'_{base.__name__.lstrip("_")}{name}'
+            names.append(name)
+
+    return tuple(names)
+
+
+def _slot_values(obj, names: tuple[str, ...]) -> dict:
+    """
+    Return the set __slots__ members of obj, the unset ones are skipped.
+    """
+    values = {}
+    for name in names:
+        try:
+            values[name] = object.__getattribute__(obj, name)
+        except AttributeError:
+            pass
+
+    return values
 
 
-def _frozen__setattr__(cls, self, key, value):
-    if key not in self.__dict__ and not self.has_annotation(key):
-        raise AttributeError(key)
-    super(cls, self).__setattr__(key, value)
+def _copy_slots(source, target, names: tuple[str, ...], memo: dict | None = None):
+    """
+    Copy the set __slots__ members, deep copied if memo is given.
+    """
+    for name, value in _slot_values(source, names).items():
+        if memo is not None:
+            value = copy.deepcopy(value, memo)
+        # bypasses the __setattr__() of frozen nodes, as copying does by default
+        object.__setattr__(target, name, value)
 
 
 def frozen(cls):
-    cls.__setattr__ = lambda self, key, value: _frozen__setattr__(cls, self, key, value)
+    cls.__setattr__ = _frozen__setattr__(cls)
+    cls.__node_frozen__ = True
+    if '__init__' in cls.__dict__:
+        cls.__init__ = _frozen__init__(cls.__init__)
     return cls
 
 
-class _MetaNode(collections.abc.MutableMapping):
+def _is_generated(cls, name: str) -> bool:
+    """
+    Check whether the method is the generic one of Node or a generated one
+    (and not defined by the user), so that it can be (re)generated for cls.
+    """
+    for base in cls.__mro__:
+        if name in base.__dict__:
+            func = base.__dict__[name]
+            return base is Node or getattr(getattr(func, '__func__', func), '__node_generated__', False)
 
-    def __new__(cls, name, bases, dct):
-        x = super().__new__(cls)
+    return True
 
-        for k, v in dct.items():
-            x['k'] = v
-        return x
 
-    def __len__(self):
-        return len(self.__dict__)
+# local names of the generated create(), cannot be used as parameter names
+_CREATE_LOCALS = frozenset(('__cls', '__node', '__kwargs'))
 
-    def __getitem__(self, key):
-        return getattr(self, key)
 
-    def __setitem__(self, key, value):
-        return setattr(self, key, value)
+def _can_generate_create(cls) -> bool:
+    """
+    Check whether each annotated member can be a parameter of a generated create(),
+    annotations set via type() or __annotations__ may be any string.
+    """
+    return all(
+        field.isidentifier() and not keyword.iskeyword(field) and field not in _CREATE_LOCALS
+        for field in cls.__node_fields__
+    )
 
-    def __iter__(self):
-        return iter(self.__dict__)
 
-    def __delitem__(self, key):
-        raise RuntimeError('Unable to delete key {}'.format(key))
+def _generate_create(cls):
+    """
+    Generate create() with a keyword argument for each annotated member,
+    the unannotated ones are loaded (and checked) by load_node().
+    """
+    fields = list(cls.__node_annotations__)
+    params = ''.join(f'{field}=__node_missing__, ' for field in fields)
+    lines = [
+        f'def create(__cls, /, *, {params}**__kwargs):',
+        '    __node = __cls()',
+    ]
+    for field in fields:
+        lines.append(f'    if {field} is not __node_missing__:')
+        lines.append(f'        __node_load_member__(__node, {field!r}, {field})')
+    lines.append('    if __kwargs:')
+    lines.append('        __node_load__(__node, __kwargs, raise_error=True)')
+    lines.append('    return __node')
+
+    namespace = dict(
+        __node_missing__=_MISSING,
+        __node_load_member__=_load_member,
+        __node_load__=load_node,
+    )
+    exec('\n'.join(lines), namespace)
+
+    create = namespace['create']
+    create.__qualname__ = f'{cls.__qualname__}.create'
+    create.__doc__ = Node.create.__doc__
+    create.__node_generated__ = True
+    return classmethod(create)
+
+
+def _default_factory(annotation):
+    """
+    Return the callable creating the default value of an annotated member:
+    NodeList[X] (or its subclass) creates a NodeList of X (list[X] remains a plain list),
+    other generic aliases their origin, and anything else itself.
+    """
+    if isinstance(annotation, types.GenericAlias):
+        origin = annotation.__origin__
+        args = annotation.__args__
+        if (isinstance(origin, type) and issubclass(origin, NodeList)
+                and len(args) == 1 and isinstance(args[0], type) and issubclass(args[0], Node)):
+            return functools.partial(origin, args[0])
+        return origin
 
-    def __repr__(self):
-        return str(self.__dict__)
+    return annotation
 
-    def __contains__(self, item):
-        return item in self.__dict__ or self.has_annotation(item)
 
-    def has_annotation(self, name: str):
+def _represent_node(dumper, node):
+    return dumper.represent_dict(node.as_dict())
+
+
+def _represent_node_list(dumper, node_list):
+    return dumper.represent_list(node_list.as_list())
+
+
+def _register_yaml_representer(cls: type, representer):
+    """
+    Dump the instances of cls and its subclasses as plain YAML mappings / sequences
+    if PyYAML is installed; it's an optional dependency.
+    """
+    if yaml is None:
+        return
+
+    # the representers cover the dumpers without own representer tables, even custom ones
+    dumpers = [yaml.representer.SafeRepresenter, yaml.representer.Representer, yaml.Dumper, yaml.SafeDumper]
+    if hasattr(yaml, 'CDumper'):
+        dumpers += [yaml.CDumper, yaml.CSafeDumper]
+
+    for dumper in dumpers:
+        dumper.add_multi_representer(cls, representer)
 
-        if name not in self.__annotations__:
-            for base in yield_bases(self.__class__):
-                if name in base.__annotations__:
-                    return True
 
-            return False
+class _MetaNode(abc.ABCMeta):
+    """
+    Metaclass of Node, collects the annotated members of the class
+    and its bases once, at class creation time.
+    """
+
+    def __new__(mcs, name, bases, dct, **kwargs):
+        cls = super().__new__(mcs, name, bases, dct, **kwargs)
 
-        return True
+        annotations = {}
+        for base in reversed(cls.__mro__):
+            annotations.update(base.__dict__.get('__annotations__', {}))
 
-    def __hash__(self):
-        return hash(self.__dict__)
+        cls.__node_annotations__ = annotations
+        cls.__node_fields__ = frozenset(annotations)
+        cls.__node_factories__ = {k: _default_factory(v) for k, v in annotations.items()}
+        cls.__node_custom_setattr__ = _has_custom_setattr(cls)
+        cls.__node_slots__ = _slot_names(cls)
+
+        if cls.__node_fields__ and _is_generated(cls, 'create') and _can_generate_create(cls):
+            cls.create = _generate_create(cls)
+
+        return cls
 
 
 def yield_bases(cls):
+    """
+    Yield the base classes of cls recursively, except Node and object.
+    Node no longer uses it, the annotations are collected by its metaclass.
+    """
     for base in cls.__bases__:
         if base != object and base != Node:
             yield base
             yield from yield_bases(base)
 
 
-class Node(collections.abc.MutableMapping):
+class _NodeItemsView(collections.abc.ItemsView):
+    """
+    Iterate over the items of the node's __dict__ instead of calling __getitem__()
+    for each member, `in` is still checked via the node.
+    """
+
+    def __iter__(self):
+        return iter(self._mapping.__dict__.items())
+
+
+class _NodeValuesView(collections.abc.ValuesView):
+    """
+    Iterate over the values of the node's __dict__ instead of calling __getitem__()
+    for each member.
+    """
+
+    def __iter__(self):
+        return iter(self._mapping.__dict__.values())
+
+
+class Node(collections.abc.MutableMapping, metaclass=_MetaNode):
     """
     Base class for dict-based data objects and dict trees.
 
@@ -93,6 +321,11 @@ class Node(collections.abc.MutableMapping):
     but closed to add any new member.
     """
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if getattr(cls, '__node_frozen__', False) and '__init__' in cls.__dict__:
+            cls.__init__ = _frozen__init__(cls.__init__)
+
     def __len__(self):
         return len(self.__dict__)
 
@@ -103,11 +336,11 @@ class Node(collections.abc.MutableMapping):
         if key in self.__dict__:
             return self.__dict__[key]
 
-        attr = self.get_annotation(key)
-        if attr is None:
+        factory = self.__class__.__node_factories__.get(key)
+        if factory is None:
             raise AttributeError(key)
 
-        v = attr()
+        v = factory()
         self.__setitem__(key, v)
         return v
 
@@ -124,27 +357,80 @@ class Node(collections.abc.MutableMapping):
         return str(self.__dict__)
 
     def __contains__(self, item):
-        return item in self.__dict__ or self.has_annotation(item)
-
-    def has_annotation(self, name: str):
-        if name not in self.__class__.__annotations__:
-            for base in yield_bases(self.__class__):
-                if name in base.__annotations__:
-                    return True
+        # most lookups are hits in __dict__, so it's checked first
+        return item in self.__dict__ or item in self.__class__.__node_fields__
 
-            return False
+    def get(self, key, default=None):
+        """
+        Return the member, or default if it's unknown, without raising
+        (and catching) AttributeError as a getattr() based lookup would.
+        Unlike attribute access, it doesn't store the default value
+        of an annotation-only member, only returns a new one.
+        """
+        members = self.__dict__
+        if key in members:
+            return members[key]
+
+        factory = self.__class__.__node_factories__.get(key)
+        if factory is None:
+            return default
+
+        for base in self.__class__.__mro__:
+            if key in base.__dict__:
+                # class-level default value; getattr() on the class would find
+                # the attributes of the metaclass too, e.g. ABCMeta.register()
+                return getattr(self, key)
+
+        return factory()
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+
+        self[key] = default
+        return default
+
+    # keys() is inherited: its iteration is already the one of __dict__
+
+    def items(self):
+        return _NodeItemsView(self)
+
+    def values(self):
+        return _NodeValuesView(self)
+
+    def __eq__(self, other):
+        # compare to __dict__ directly instead of building a dict from both sides
+        if isinstance(other, dict):
+            return self.__dict__ == other
+        elif isinstance(other, Node):
+            return self.__dict__ == other.__dict__
+        elif isinstance(other, collections.abc.Mapping):
+            return self.__dict__ == dict(other.items())
+
+        return NotImplemented
+
+    def __copy__(self):
+        cls = self.__class__
+        node = cls.__new__(cls)
+        node.__dict__.update(self.__dict__)
+        if cls.__node_slots__:
+            _copy_slots(self, node, cls.__node_slots__)
+        return node
+
+    def __deepcopy__(self, memo):
+        cls = self.__class__
+        node = cls.__new__(cls)
+        memo[id(self)] = node
+        node.__dict__.update(copy.deepcopy(self.__dict__, memo))
+        if cls.__node_slots__:
+            _copy_slots(self, node, cls.__node_slots__, memo)
+        return node
 
-        return True
+    def has_annotation(self, name: str):
+        return name in self.__class__.__node_fields__
 
     def get_annotation(self, name: str):
-        if name in self.__class__.__annotations__:
-            return self.__class__.__annotations__[name]
-        else:
-            for base in yield_bases(self.__class__):
-                if name in base.__annotations__:
-                    return base.__annotations__[name]
-
-        return None
+        return self.__class__.__node_annotations__.get(name)
 
     def load_from(self, data: dict, *, raise_error: bool = False):
         load_node(self, data, raise_error=raise_error)
@@ -157,6 +443,11 @@ class Node(collections.abc.MutableMapping):
 
     @classmethod
     def create(cls, /, **kwargs):
+        """
+        Create a new node and load the members from the keyword arguments,
+        raising AttributeError for unknown members.
+        In subclasses with annotated members this method is generated.
+        """
         n = cls()
         n.load_from(kwargs, raise_error=True)
         return n
@@ -168,7 +459,8 @@ class Node(collections.abc.MutableMapping):
         """
         result = {}
         for key, value in self.__dict__.items():
-            if isinstance(value, Node):
+            # faster than isinstance(value, Node), which goes through the ABC machinery
+            if isinstance(type(value), _MetaNode):
                 result[key] = value.as_dict()
             elif isinstance(value, NodeList):
                 result[key] = value.as_list()
@@ -179,32 +471,92 @@ class Node(collections.abc.MutableMapping):
 
 
 class NodeList(list):
+    __slots__ = ('type_', '__weakref__')
+
     type_: type[Node]
 
     def __init__(self, member_type: type[Node]):
         super().__init__()
         self.type_ = member_type
 
+    def __copy__(self):
+        cls = self.__class__
+        node_list = cls.__new__(cls)
+        _copy_slots(self, node_list, _slot_names(cls))
+        if hasattr(self, '__dict__'):
+            # instance members of subclasses
+            node_list.__dict__.update(self.__dict__)
+        node_list.extend(self)
+        return node_list
+
+    def __deepcopy__(self, memo):
+        cls = self.__class__
+        node_list = cls.__new__(cls)
+        memo[id(self)] = node_list
+        _copy_slots(self, node_list, _slot_names(cls), memo)
+        if hasattr(self, '__dict__'):
+            node_list.__dict__.update(copy.deepcopy(self.__dict__, memo))
+        node_list.extend(copy.deepcopy(x, memo) for x in self)
+        return node_list
+
+    def __getstate__(self):
+        # the default state of classes with __slots__, which protocols 0 and 1
+        # can pickle only via an explicit __getstate__()
+        return getattr(self, '__dict__', None) or None, _slot_values(self, _slot_names(self.__class__))
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple):
+            # (instance __dict__ of subclasses or None, slots)
+            state, slots = state
+        else:
+            # the __dict__ of older versions without __slots__
+            state, slots = None, state
+
+        if state:
+            self.__dict__.update(state)
+        for key, value in slots.items():
+            setattr(self, key, value)
+
     def load_from(self, data: list):
-        self.clear()
+        member_type = self.type_
+        nodes = []
+        append = nodes.append
         for item in data:
-            if isinstance(item, Node):
-                self.append(item)
+            # dict is the common case, it's cheaper to check than the ABC-based Node
+            if type(item) is not dict and isinstance(item, Node):
+                append(item)
             else:
-                node = self.type_()
+                node = member_type()
                 node.load_from(item)
-                self.append(node)
+                append(node)
+
+        self[:] = nodes
 
     def as_list(self) -> list:
-        return [x.as_dict() if isinstance(x, Node) else x for x in self]
+        # isinstance(type(x), _MetaNode) is a faster isinstance(x, Node), see Node.as_dict()
+        return [x.as_dict() if isinstance(type(x), _MetaNode) else x for x in self]
+
+
+_register_yaml_representer(Node, _represent_node)
+_register_yaml_representer(NodeList, _represent_node_list)
 
 
 def load_node(node: Node, d: dict, *, raise_error: bool = False):
+    members = node.__dict__
+    fields = node.__class__.__node_fields__
     for key, value in d.items():
-        if key in node and isinstance(node[key], (Node, NodeList)):
-            node[key].load_from(value)
-        elif key in node:
-            node[key] = value
+        # get() inlined, this is the hot path of loading
+        member = members.get(key, _MISSING)
+        if member is _MISSING and key in fields:
+            # class-level default value or annotation-only member
+            member = node[key]
+
+        if member is not _MISSING:
+            # isinstance(type(member), _MetaNode) is a faster isinstance(member, Node)
+            if isinstance(type(member), _MetaNode) or isinstance(member, NodeList):
+                member.load_from(value)
+            else:
+                node[key] = value
         elif not raise_error:
             if isinstance(value, dict):
                 node[key] = Node()
@@ -223,6 +575,14 @@ def load_node(node: Node, d: dict, *, raise_error: bool = False):
             raise AttributeError(key)
 
 
+def _load_member(node: Node, key: str, value):
+    member = node[key]
+    if isinstance(type(member), _MetaNode) or isinstance(member, NodeList):
+        member.load_from(value)
+    else:
+        node[key] = value
+
+
 def as_dict(data: Node) -> dict:
     """
     Wrapper method of Node.as_dict() inspired by attrs.as_dict()
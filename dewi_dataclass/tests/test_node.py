@@ -1,7 +1,18 @@
 # Copyright 2018-2022 Laszlo Attila Toth
 # Distributed under the terms of the Apache License, Version 2.0
 
+import copy
+import gc
+import pickle
+import types
 import unittest
+import unittest.mock
+import weakref
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
 
 import dewi_dataclass
 import dewi_dataclass.node
@@ -29,6 +40,11 @@ class N2(Node):
         self.count = 100
 
 
+class PickledNodeList(NodeList):
+    # at module level, to be found by pickle
+    pass
+
+
 TEST_RESULT_DICT = {
     'count': 100,
     'list_of_n1s': [
@@ -57,27 +73,218 @@ class NodeAndNodeListTest(unittest.TestCase):
     def test_empty_object(self):
         self.assertEqual(EMPTY_N2_DICT, N2())
 
+    def test_equality(self):
+        other = N2()
+        other.load_from(TEST_RESULT_DICT)
+        self.assertEqual(other, self.tested)
+        self.assertEqual(self.tested, types.MappingProxyType(TEST_RESULT_DICT))
+        self.assertEqual(TEST_RESULT_DICT, self.tested)
+
+        other.list_of_n1s[1].y = 43
+        self.assertNotEqual(other, self.tested)
+        self.assertNotEqual(dict(TEST_RESULT_DICT, title='title'), self.tested)
+        self.assertNotEqual(dict(TEST_RESULT_DICT, extra=None), self.tested)
+        self.assertNotEqual(list(TEST_RESULT_DICT), self.tested)
+
     def test_load_from_dict(self):
         tested = N2()
         tested.load_from(dict(list_of_n1s=[dict(x=0, y=None), dict(x=0, y=42)], title=None))
         self.assertEqual(TEST_RESULT_DICT, tested)
         self.assertNotIsInstance(tested, dict)
 
+    def test_load_from_dict_into_annotated_members(self):
+        class T(N2):
+            level: int = 3
+
+        tested = T()
+        tested.load_from(dict(args=dict(verbose=True), level=4, extra=dict(a=1)))
+        self.assertIsInstance(tested.args, Node)
+        self.assertEqual(dict(verbose=True), tested.args)
+        self.assertEqual(4, tested.level)
+        self.assertEqual(3, T.level)
+        self.assertIsInstance(tested.extra, Node)
+        self.assertEqual(dict(a=1), tested.extra)
+
     def test_as_dict(self):
         tested = N2()
         tested.load_from(dict(list_of_n1s=[dict(x=0, y=None), dict(x=0, y=42)], title=None))
         self.assertEqual(TEST_RESULT_DICT, tested.as_dict())
         self.assertIsInstance(tested.as_dict(), dict)
 
+    def test_as_dict_converts_nested_nodes(self):
+        self.tested.args['verbose'] = True
+        self.tested.extra = [1, 2]
+        result = self.tested.as_dict()
+        self.assertEqual(dict(TEST_RESULT_DICT, args=dict(verbose=True), extra=[1, 2]), result)
+        self.assertIs(dict, type(result['args']))
+        self.assertIs(list, type(result['list_of_n1s']))
+        self.assertIs(dict, type(result['list_of_n1s'][0]))
+
+    def test_that_converted_node_classes_are_not_kept_alive(self):
+        class T(Node):
+            x: int
+
+        tested = N2()
+        tested.extra = T()
+        tested.as_dict()
+
+        ref = weakref.ref(T)
+        del T, tested
+        gc.collect()
+        self.assertIsNone(ref())
+
+    def test_that_loaded_node_classes_are_not_kept_alive(self):
+        class T(Node):
+            x: int
+
+        tested = N2()
+        tested.extra = T()
+        tested.load_from(dict(extra=dict(x=1)))
+        self.assertEqual(1, tested.extra.x)
+
+        ref = weakref.ref(T)
+        del T, tested
+        gc.collect()
+        self.assertIsNone(ref())
+
+    def test_as_dict_uses_current_as_dict_of_members(self):
+        self.tested.as_dict()
+        with unittest.mock.patch.object(N1, 'as_dict', return_value='patched'):
+            self.assertEqual(['patched', 'patched'], self.tested.as_dict()['list_of_n1s'])
+
+    def test_as_list_converts_nodes_only(self):
+        self.tested.list_of_n1s.append(42)
+        result = self.tested.list_of_n1s.as_list()
+        self.assertEqual(TEST_RESULT_DICT['list_of_n1s'] + [42], result)
+        self.assertIs(list, type(result))
+        self.assertIs(dict, type(result[1]))
+
     def test_size_of_empty_object(self):
         self.assertEqual(3, len(N2()))
 
     def test_size_of_filled_object(self):
         self.assertEqual(3, len(self.tested))
 
+    def test_size_counts_set_members_only(self):
+        # 'args' is annotated but not set yet
+        self.assertEqual(4, len(N2.__node_fields__))
+        self.assertEqual(3, len(self.tested))
+        self.assertIsInstance(self.tested.args, Node)
+        self.assertEqual(4, len(self.tested))
+        self.tested['as_key'] = 4
+        self.assertEqual(5, len(self.tested))
+
     def test_size_of_node_list_equals_item_count(self):
         self.assertEqual(2, len(self.tested.list_of_n1s))
 
+    def test_node_list_has_no_instance_dict(self):
+        self.assertFalse(hasattr(self.tested.list_of_n1s, '__dict__'))
+        with self.assertRaises(AttributeError):
+            self.tested.list_of_n1s.extra = 1
+
+    def test_node_list_supports_weakref(self):
+        self.assertIs(self.tested.list_of_n1s, weakref.ref(self.tested.list_of_n1s)())
+
+    def test_pickle_node_list(self):
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            with self.subTest(protocol=protocol):
+                loaded = pickle.loads(pickle.dumps(self.tested.list_of_n1s, protocol=protocol))
+                self.assertIs(NodeList, type(loaded))
+                self.assertEqual(N1, loaded.type_)
+                self.assertEqual(TEST_RESULT_DICT['list_of_n1s'], loaded)
+
+    def test_pickle_node_list_subclass(self):
+        node_list = PickledNodeList(N1)
+        node_list.append(N1())
+        node_list.extra = 1
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            with self.subTest(protocol=protocol):
+                loaded = pickle.loads(pickle.dumps(node_list, protocol=protocol))
+                self.assertIs(PickledNodeList, type(loaded))
+                self.assertEqual(N1, loaded.type_)
+                self.assertEqual([dict(x=0, y=None)], loaded)
+                self.assertEqual(1, loaded.extra)
+
+    def test_unpickle_node_list_pickled_with_instance_dict(self):
+        # NodeList(Node) with a Node(x=1) item, pickled before NodeList had __slots__
+        data = (b'\x80\x04\x95N\x00\x00\x00\x00\x00\x00\x00\x8c\x13dewi_dataclass.node\x94\x8c\x08NodeList'
+                b'\x94\x93\x94)\x81\x94h\x00\x8c\x04Node\x94\x93\x94)\x81\x94}\x94\x8c\x01x\x94K\x01sba}'
+                b'\x94\x8c\x05type_\x94h\x05sb.')
+        loaded = pickle.loads(data)
+        self.assertIsInstance(loaded, NodeList)
+        self.assertEqual(Node, loaded.type_)
+        self.assertEqual([dict(x=1)], loaded)
+
+    def test_load_node_list_replaces_items(self):
+        node = N1()
+        self.tested.list_of_n1s.load_from([dict(x=1, y=2), node])
+        self.assertEqual([dict(x=1, y=2), dict(x=0, y=None)], self.tested.list_of_n1s)
+        self.assertIsInstance(self.tested.list_of_n1s[0], N1)
+        self.assertIs(node, self.tested.list_of_n1s[1])
+
+    def test_copy(self):
+        copied = copy.copy(self.tested)
+        self.assertIsInstance(copied, N2)
+        self.assertEqual(TEST_RESULT_DICT, copied)
+        self.assertIs(self.tested.list_of_n1s, copied.list_of_n1s)
+        copied.title = 'copy'
+        self.assertIsNone(self.tested.title)
+
+    def test_deepcopy(self):
+        self.tested.other_list = self.tested.list_of_n1s
+        copied = copy.deepcopy(self.tested)
+        self.assertIsInstance(copied, N2)
+        self.assertEqual(self.tested, copied)
+        self.assertIsInstance(copied.list_of_n1s, NodeList)
+        self.assertEqual(N1, copied.list_of_n1s.type_)
+        self.assertIsNot(self.tested.list_of_n1s, copied.list_of_n1s)
+        self.assertIsNot(self.tested.list_of_n1s[1], copied.list_of_n1s[1])
+        self.assertIs(copied.list_of_n1s, copied.other_list)
+
+    def test_copy_of_node_subclass_with_slots(self):
+        class T(N1):
+            __slots__ = ('cache', '__private')
+
+        node = T()
+        node.cache = [1]
+        node._T__private = 2
+        for copied in (copy.copy(node), copy.deepcopy(node)):
+            self.assertEqual(dict(x=0, y=None), copied)
+            self.assertEqual([1], copied.cache)
+            self.assertEqual(2, copied._T__private)
+
+        self.assertIs(node.cache, copy.copy(node).cache)
+        self.assertIsNot(node.cache, copy.deepcopy(node).cache)
+
+    def test_copy_of_node_list_subclass(self):
+        class L(NodeList):
+            pass
+
+        node_list = L(N1)
+        node_list.append(N1())
+        node_list.extra = [1]
+        for copied in (copy.copy(node_list), copy.deepcopy(node_list)):
+            self.assertIsInstance(copied, L)
+            self.assertEqual(N1, copied.type_)
+            self.assertEqual([dict(x=0, y=None)], copied)
+            self.assertEqual([1], copied.extra)
+
+        self.assertIs(node_list.extra, copy.copy(node_list).extra)
+        self.assertIsNot(node_list.extra, copy.deepcopy(node_list).extra)
+
+    def test_copy_of_frozen_node(self):
+        @frozen
+        class T(Node):
+            x: int
+
+            def __init__(self):
+                self.x = 1
+
+        copied = copy.deepcopy(T())
+        self.assertEqual(1, copied.x)
+        with self.assertRaises(AttributeError):
+            copied.y = 2
+
     def test_contains_known_members(self):
         self.assertIn('list_of_n1s', self.tested)
 
@@ -89,6 +296,54 @@ class NodeAndNodeListTest(unittest.TestCase):
         self.tested['as_key'] = 4
         self.assertIn('as_key', self.tested)
 
+    def test_mapping_views_contain_set_members(self):
+        self.tested['as_key'] = 4
+        self.assertEqual(['list_of_n1s', 'title', 'count', 'as_key'], list(self.tested.keys()))
+        self.assertEqual([None, 100, 4], list(self.tested.values())[1:])
+        self.assertEqual(('as_key', 4), list(self.tested.items())[-1])
+        self.assertIs(self.tested.list_of_n1s, next(iter(self.tested.values())))
+
+    def test_mapping_views_check_membership_via_node(self):
+        self.assertIn('args', self.tested.keys())
+        self.assertNotIn('another_member', self.tested.keys())
+        self.assertIn(('count', 100), self.tested.items())
+        self.assertNotIn(('count', 5), self.tested.items())
+        self.assertIn(100, self.tested.values())
+
+    def test_get(self):
+        self.assertEqual(100, self.tested.get('count'))
+        self.assertIsNone(self.tested.get('title', 5))
+        self.assertIsNone(self.tested.get('another_member'))
+        self.assertEqual(5, self.tested.get('another_member', 5))
+        self.assertIsNone(self.tested.get('load_from'))
+
+    def test_that_get_does_not_store_annotation_only_member(self):
+        self.assertIsInstance(self.tested.get('args'), Node)
+        self.assertEqual(3, len(self.tested))
+        self.assertNotIn('args', list(self.tested))
+
+    def test_get_class_level_default_value(self):
+        class T(Node):
+            x: int = 42
+
+        self.assertEqual(42, T().get('x'))
+
+    def test_get_ignores_attributes_of_metaclass(self):
+        class T(Node):
+            register: int
+            mro: str
+
+        tested = T()
+        self.assertEqual(0, tested.get('register'))
+        self.assertEqual('', tested.get('mro'))
+        self.assertEqual(0, len(tested))
+
+    def test_setdefault(self):
+        self.assertEqual(100, self.tested.setdefault('count', 5))
+        self.assertEqual(5, self.tested.setdefault('as_key', 5))
+        self.assertEqual(5, self.tested.as_key)
+        self.assertIsInstance(self.tested.setdefault('args', 5), Node)
+
     def test_that_get_unknown_member_raises_attribute_error(self):
         self.assertRaises(AttributeError, lambda: self.tested.a_member)
         self.assertRaises(AttributeError, lambda: self.tested['another_member'])
@@ -131,6 +386,21 @@ class NodeAndNodeListTest(unittest.TestCase):
         tested = T()
         self.assertIn('x', tested)
 
+    def test_that_in_checks_annotations_of_base_classes(self):
+        class T(Node):
+            x: int
+
+        class U(T):
+            y: str
+
+        class V(U):
+            x: list[str]
+
+        tested = V()
+        self.assertIn('x', tested)
+        self.assertIn('y', tested)
+        self.assertEqual(list(), tested.x)
+
     def test_annotations_only_member(self):
         class T(Node):
             x: int
@@ -140,6 +410,41 @@ class NodeAndNodeListTest(unittest.TestCase):
         self.assertEqual(0, tested.x)
         self.assertEqual(list(), tested.y)
 
+    def test_annotations_only_member_is_created_once(self):
+        class T(Node):
+            y: list[str]
+
+        tested = T()
+        tested.y.append('a')
+        self.assertEqual(['a'], tested.y)
+        self.assertIs(tested.y, tested['y'])
+
+    def test_annotations_only_list_of_nodes_member(self):
+        class T(Node):
+            x: list[N1]
+            y: NodeList[N1]
+
+        tested = T()
+        self.assertIs(list, type(tested.x))
+        self.assertIsInstance(tested.y, NodeList)
+        self.assertEqual(N1, tested.y.type_)
+
+        tested.load_from(dict(x=[dict(x=1, y=2)], y=[dict(x=3, y=4)]))
+        self.assertIs(dict, type(tested.x[0]))
+        self.assertIsInstance(tested.y[0], N1)
+        self.assertEqual(dict(x=3, y=4), tested.y[0])
+
+    def test_annotations_only_node_list_subclass_member(self):
+        class L(NodeList):
+            pass
+
+        class T(Node):
+            y: L[N1]
+
+        tested = T()
+        self.assertIs(L, type(tested.y))
+        self.assertEqual(N1, tested.y.type_)
+
     def test_that_class_level_default_value_can_be_set(self):
         class T(Node):
             x: int = 42
@@ -224,6 +529,166 @@ class NodeAndNodeListTest(unittest.TestCase):
 
         self.assertEqual('y', ctx.exception.args[0])
 
+    def test_that_frozen_node_init_reports_first_unknown_member(self):
+        @frozen
+        class T(Node):
+            x: int
+
+            def __init__(self):
+                self.y = 1
+                self.x = 0
+                self.z = 2
+
+        with self.assertRaises(AttributeError) as ctx:
+            T()
+
+        self.assertEqual('y', ctx.exception.args[0])
+
+    def test_that_frozen_node_init_checks_members_after_init(self):
+        @frozen
+        class T(Node):
+            x: int
+
+            def __init__(self):
+                try:
+                    self.y = 1
+                except AttributeError:
+                    self.x = 0
+
+        with self.assertRaises(AttributeError) as ctx:
+            T()
+
+        self.assertEqual('y', ctx.exception.args[0])
+
+    def test_that_frozen_node_init_can_bypass_setattr(self):
+        @frozen
+        class T(Node):
+            x: int
+
+            def __init__(self):
+                self.x = 0
+                object.__setattr__(self, '_cache', {})
+                self.__dict__['_other'] = 1
+                self._other = 2
+
+        tested = T()
+        self.assertEqual(dict(x=0, _cache={}, _other=2), tested)
+        with self.assertRaises(AttributeError):
+            tested.y = 1
+
+    def test_that_only_outermost_frozen_node_init_checks_members(self):
+        @frozen
+        class Point(Node):
+            x: int
+
+            def __init__(self):
+                self.x = 1
+
+        class Point3D(Point):
+            z: int
+
+            def __init__(self):
+                # a temporary member during the base class' __init__()
+                self.tmp = 0
+                super().__init__()
+                del self.__dict__['tmp']
+                self.z = 3
+
+        self.assertEqual(dict(x=1, z=3), Point3D())
+
+    def test_that_frozen_node_init_keeps_custom_setattr_of_base(self):
+        class Base(Node):
+            def __setattr__(self, key, value):
+                super().__setattr__(key, str(value))
+
+        @frozen
+        class T(Base):
+            x: int
+
+            def __init__(self):
+                self.x = 1
+
+        self.assertEqual('1', T().x)
+
+    def test_that_frozen_node_subclass_keeps_setattr_of_mixin(self):
+        class Mixin:
+            def __setattr__(self, key, value):
+                super().__setattr__(key, ('mixed', value))
+
+        @frozen
+        class T(Node):
+            x: int
+
+        class U(T, Mixin):
+            pass
+
+        tested = U()
+        tested.x = 1
+        self.assertEqual(('mixed', 1), tested.x)
+        with self.assertRaises(AttributeError):
+            tested.as_member = 123
+
+    def test_frozen_node_created_in_init_of_frozen_node(self):
+        @frozen
+        class Inner(Node):
+            y: int
+
+            def __init__(self):
+                self.y = 2
+
+        @frozen
+        class Outer(Node):
+            inner: Inner
+            x: int
+
+            def __init__(self):
+                self.inner = Inner()
+                self.x = 1
+
+        tested = Outer()
+        self.assertEqual(1, tested.x)
+        self.assertEqual(2, tested.inner.y)
+        self.assertEqual({}, dewi_dataclass.node._initializing)
+        for node in (tested, tested.inner):
+            with self.assertRaises(AttributeError):
+                node.as_member = 123
+
+    def test_frozen_node_init_called_via_super(self):
+        @frozen
+        class Point(Node):
+            x: int
+
+            def __init__(self):
+                self.x = 1
+
+        @frozen
+        class Point3D(Point):
+            z: int
+
+            def __init__(self):
+                super().__init__()
+                self.z = 3
+
+        tested = Point3D()
+        self.assertEqual(dict(x=1, z=3), tested)
+        self.assertEqual({}, dewi_dataclass.node._initializing)
+        with self.assertRaises(AttributeError):
+            tested.as_member = 123
+
+    def test_that_failing_frozen_node_init_is_cleaned_up(self):
+        @frozen
+        class T(Node):
+            x: int
+
+            def __init__(self):
+                self.x = 1
+                raise ValueError('failed')
+
+        with self.assertRaises(ValueError):
+            T()
+
+        self.assertEqual({}, dewi_dataclass.node._initializing)
+
     def test_create_node_with_partial_args(self):
         n = N1.create(x=1)
         self.assertEqual(1, n.x)
@@ -244,6 +709,93 @@ class NodeAndNodeListTest(unittest.TestCase):
 
         self.assertEqual('unknown_member_name', ctx.exception.args[0])
 
+    def test_create_node_accepts_members_set_in_init(self):
+        class T(Node):
+            x: int
+
+            def __init__(self):
+                self.y = 4
+
+        n = T.create(x=3, y=22)
+        self.assertEqual(3, n.x)
+        self.assertEqual(22, n.y)
+
+    def test_create_node_loads_node_lists(self):
+        n = N2.create(list_of_n1s=[dict(x=0, y=None), dict(x=0, y=42)], title=None)
+        self.assertEqual(TEST_RESULT_DICT, n)
+        self.assertIsInstance(n.list_of_n1s, NodeList)
+        self.assertIsInstance(n.list_of_n1s[1], N1)
+
+    def test_create_node_with_non_identifier_annotations(self):
+        T = type('T', (Node,), {'__annotations__': {'a-value': int, 'class': int, 'x': int}})
+
+        n = T.create(**{'a-value': 1, 'class': 2})
+        self.assertEqual({'a-value': 1, 'class': 2}, n)
+        self.assertIs(Node.create.__func__, T.create.__func__)
+
+    def test_create_node_loads_annotated_members_in_annotation_order(self):
+        class T(Node):
+            x: int
+            y: int
+
+        self.assertEqual(['x', 'y'], list(T.create(y=1, x=2)))
+
+    def test_that_create_can_be_overridden(self):
+        class T(Node):
+            x: int
+
+            @classmethod
+            def create(cls, /, **kwargs):
+                return 'overridden'
+
+        class U(T):
+            y: int
+
+        self.assertEqual('overridden', T.create(x=1))
+        self.assertEqual('overridden', U.create(y=1))
+
+
+@unittest.skipIf(yaml is None, 'PyYAML is not installed')
+class YamlTest(unittest.TestCase):
+    def setUp(self):
+        self.tested = N2()
+        self.tested.load_from(TEST_RESULT_DICT)
+
+    def test_yaml_dump(self):
+        self.assertEqual(yaml.dump(TEST_RESULT_DICT), yaml.dump(self.tested))
+
+    def test_yaml_safe_dump(self):
+        self.assertEqual(yaml.safe_dump(TEST_RESULT_DICT), yaml.safe_dump(self.tested))
+        self.assertEqual(yaml.safe_dump(TEST_RESULT_DICT['list_of_n1s']), yaml.safe_dump(self.tested.list_of_n1s))
+
+    def test_yaml_dump_with_all_dumpers(self):
+        dumpers = [yaml.Dumper, yaml.SafeDumper]
+        if hasattr(yaml, 'CDumper'):
+            dumpers += [yaml.CDumper, yaml.CSafeDumper]
+
+        for dumper in dumpers:
+            with self.subTest(dumper=dumper.__name__):
+                self.assertEqual(yaml.dump(TEST_RESULT_DICT, Dumper=dumper), yaml.dump(self.tested, Dumper=dumper))
+
+    def test_yaml_dump_of_subclass_of_node_subclass(self):
+        class T(N1):
+            z: int
+
+        self.assertEqual(yaml.safe_dump(dict(x=0, y=None)), yaml.safe_dump(T()))
+
+    def test_yaml_dump_of_node_list_subclass(self):
+        class T(NodeList):
+            pass
+
+        tested = T(N1)
+        tested.append(N1())
+        self.assertEqual(yaml.safe_dump([dict(x=0, y=None)]), yaml.safe_dump(tested))
+
+    def test_load_from_yaml(self):
+        tested = N2()
+        tested.load_from(yaml.safe_load(yaml.safe_dump(self.tested)))
+        self.assertEqual(TEST_RESULT_DICT, tested)
+
 
 class DataClassModuleTest(unittest.TestCase):
 
@@ -256,5 +808,11 @@ class DataClassModuleTest(unittest.TestCase):
     def test_that_frozen_is_available(self):
         self.assertEqual(dewi_dataclass.frozen, dewi_dataclass.node.frozen)
 
+    def test_yield_bases(self):
+        class T(N1):
+            pass
+
+        self.assertEqual([N1], list(dewi_dataclass.node.yield_bases(T)))
+
     def test_that_as_dict_is_available(self):
         self.assertEqual(dewi_dataclass.as_dict, dewi_dataclass.node.as_dict)